@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import re
+from datetime import date, datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import fs as pafs
+
+# Arsip data tahun yang sudah tutup ke Parquet terkompresi (partisi tahun/bulan).
+# Tabel ringkasan_arsip menyimpan rollup per bulan dan jenis agar laporan tetap
+# bisa menghitung total tanpa membaca file arsip.
+
+TABEL_ARSIP = ("pemasukan", "pengeluaran")
+KOLOM_ARSIP = ["id", "jenis", "keterangan", "jumlah", "tanggal"]
+# Skema tetap untuk setiap file; tanpa ini bulan yang keterangannya NULL semua
+# ditulis sebagai kolom bertipe null dan membuat pembacaan bulan lain gagal
+SKEMA_ARSIP = pa.schema([
+    ("id", pa.int64()),
+    ("jenis", pa.string()),
+    ("keterangan", pa.string()),
+    ("jumlah", pa.int64()),
+    ("tanggal", pa.date32()),
+])
+# Skema dataset saat dibaca: kolom file ditambah kolom partisi
+SKEMA_BACA = SKEMA_ARSIP.append(pa.field("tahun", pa.int32())).append(pa.field("bulan", pa.int32()))
+ARSIP_PATH_DEFAULT = "arsip"
+# Awalan file yang belum di-commit; file berawalan "_" diabaikan saat dataset dibaca
+PREFIX_STAGING = "_staging-"
+# Channel NOTIFY perubahan data yang didengarkan proses aplikasi (lihat finance_app.py)
+CHANNEL_PERUBAHAN = "perubahan_data"
+
+CREATE_RINGKASAN_ARSIP = """
+    CREATE TABLE IF NOT EXISTS ringkasan_arsip (
+        tabel VARCHAR(20) NOT NULL,
+        tahun INTEGER NOT NULL,
+        bulan INTEGER NOT NULL,
+        jenis VARCHAR(50) NOT NULL,
+        total BIGINT NOT NULL,
+        banyak INTEGER NOT NULL,
+        PRIMARY KEY (tabel, tahun, bulan, jenis)
+    )
+"""
+
+
+def path_arsip(base, tabel):
+    """Lokasi dataset Parquet untuk satu tabel (path lokal atau URL object storage)"""
+    return f"{base.rstrip('/')}/{tabel}"
+
+
+def _filesystem(base):
+    """Filesystem pyarrow dan path root untuk folder lokal atau URL object storage"""
+    if "://" in base:
+        return pafs.FileSystem.from_uri(base)
+    return pafs.LocalFileSystem(), os.path.abspath(base)
+
+
+def baca_arsip(base, tabel, tahun, bulan=None):
+    """Baca transaksi yang sudah diarsipkan untuk satu tahun atau satu bulan.
+
+    Error baca (file hilang, object storage tidak terjangkau) diteruskan ke pemanggil.
+    """
+    filters = [("tahun", "=", int(tahun))]
+    if bulan is not None:
+        filters.append(("bulan", "=", int(bulan)))
+
+    # Dipanggil hanya jika ringkasan_arsip mencatat bulan ini diarsipkan, jadi
+    # dataset yang hilang atau tidak terbaca adalah error, bukan "tidak ada data"
+    df = pd.read_parquet(path_arsip(base, tabel), columns=KOLOM_ARSIP, filters=filters,
+                         schema=SKEMA_BACA)
+
+    return df.sort_values(["tanggal", "id"], ascending=False, ignore_index=True)
+
+
+def arsipkan_tahun(conn, tabel, tahun, base):
+    """Pindahkan semua transaksi satu tahun dari tabel ke Parquet dan isi ringkasan_arsip"""
+    if tabel not in TABEL_ARSIP:
+        raise ValueError(f"Tabel tidak dikenal: {tabel}")
+
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT id, jenis, keterangan, jumlah, tanggal FROM {tabel} WHERE tanggal >= %s AND tanggal < %s ORDER BY id",
+        (date(tahun, 1, 1), date(tahun + 1, 1, 1))
+    )
+    rows = cur.fetchall()
+    if not rows:
+        cur.close()
+        return 0
+
+    df = pd.DataFrame(rows, columns=KOLOM_ARSIP)
+    df["bulan"] = [t.month for t in df["tanggal"]]
+
+    # Tulis dulu ke file staging (diabaikan pembaca). Nama final ditentukan oleh
+    # id terakhir, jadi menjalankan ulang tidak menggandakan data.
+    fs, root = _filesystem(base)
+    nama = f"{tabel}-{tahun}-{int(df['id'].max())}.parquet"
+    file_staging = []
+    try:
+        for bulan, df_bulan in df.groupby("bulan"):
+            folder = f"{root}/{tabel}/tahun={tahun}/bulan={bulan}"
+            fs.create_dir(folder, recursive=True)
+            staging = f"{folder}/{PREFIX_STAGING}{nama}"
+            file_staging.append((staging, f"{folder}/{nama}"))
+            table = pa.Table.from_pandas(df_bulan[KOLOM_ARSIP], schema=SKEMA_ARSIP, preserve_index=False)
+            pq.write_table(table, staging, filesystem=fs, compression="zstd")
+
+        # Rollup dan penghapusan dalam satu transaksi
+        ringkasan = df.groupby(["bulan", "jenis"])["jumlah"].agg(["sum", "count"]).reset_index()
+        for r in ringkasan.itertuples(index=False):
+            cur.execute("""
+                INSERT INTO ringkasan_arsip (tabel, tahun, bulan, jenis, total, banyak)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (tabel, tahun, bulan, jenis) DO UPDATE
+                SET total = ringkasan_arsip.total + EXCLUDED.total,
+                    banyak = ringkasan_arsip.banyak + EXCLUDED.banyak
+            """, (tabel, tahun, int(r.bulan), r.jenis, int(r.sum), int(r.count)))
+
+        cur.execute(f"DELETE FROM {tabel} WHERE id = ANY(%s)", ([int(i) for i in df["id"]],))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        for staging, _ in file_staging:
+            _hapus_file(fs, staging)
+        raise
+    finally:
+        cur.close()
+
+    # Baru terlihat oleh pembaca setelah transaksi berhasil
+    for staging, final in file_staging:
+        fs.move(staging, final)
+
+    # NOTIFY dari trigger DELETE terkirim saat commit, sebelum file di-rename;
+    # cache yang terisi di antaranya belum berisi baris arsip, jadi dibuang lagi
+    kirim_notifikasi(conn, tabel, tahun, sorted(df["bulan"].unique()))
+    return len(df)
+
+
+def kirim_notifikasi(conn, tabel, tahun, daftar_bulan):
+    """Kirim NOTIFY perubahan data untuk bulan-bulan yang arsipnya baru terlihat"""
+    try:
+        cur = conn.cursor()
+        for bulan in daftar_bulan:
+            payload = json.dumps({"tabel": tabel, "tahun": int(tahun), "bulan": int(bulan)})
+            cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL_PERUBAHAN, payload))
+        conn.commit()
+        cur.close()
+    except Exception as e:
+        conn.rollback()
+        print(f"Gagal mengirim notifikasi perubahan {tabel} {tahun}: {e}")
+
+
+def _hapus_file(fs, path):
+    try:
+        fs.delete_file(path)
+    except (FileNotFoundError, OSError):
+        pass
+
+
+def pulihkan_staging(conn, base):
+    """Selesaikan file staging yang tertinggal dari run yang terhenti.
+
+    Jika baris di dalamnya sudah tidak ada di tabel, transaksinya sudah
+    commit dan file dipindahkan ke nama final; jika masih ada, file dihapus.
+    """
+    fs, root = _filesystem(base)
+    cur = conn.cursor()
+    dipulihkan = []
+    for tabel in TABEL_ARSIP:
+        selector = pafs.FileSelector(f"{root}/{tabel}", recursive=True, allow_not_found=True)
+        for info in fs.get_file_info(selector):
+            if info.type != pafs.FileType.File or not info.base_name.startswith(PREFIX_STAGING):
+                continue
+            ids = pq.read_table(info.path, columns=["id"], filesystem=fs).column("id").to_pylist()
+            cur.execute(f"SELECT EXISTS (SELECT 1 FROM {tabel} WHERE id = ANY(%s))", (ids,))
+            if cur.fetchone()[0]:
+                _hapus_file(fs, info.path)
+                print(f"File staging dibatalkan: {info.path}")
+            else:
+                final = info.path.replace(f"/{PREFIX_STAGING}", "/", 1)
+                fs.move(info.path, final)
+                print(f"File staging dipulihkan: {final}")
+                partisi = re.search(r"/tahun=(\d+)/bulan=(\d+)/", final)
+                if partisi:
+                    dipulihkan.append((tabel, int(partisi.group(1)), int(partisi.group(2))))
+    conn.rollback()
+    cur.close()
+
+    for tabel, tahun, bulan in dipulihkan:
+        kirim_notifikasi(conn, tabel, tahun, [bulan])
+
+
+def main():
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description="Arsipkan tahun yang sudah tutup ke Parquet")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"),
+                        help="DSN Postgres (default: env DATABASE_URL)")
+    parser.add_argument("--arsip-path", default=os.environ.get("ARSIP_PATH", ARSIP_PATH_DEFAULT),
+                        help="Folder lokal atau URL object storage, mis. s3://bucket/arsip")
+    parser.add_argument("--tahun", type=int, nargs="*",
+                        help="Tahun yang diarsipkan (default: semua tahun sebelum tahun ini)")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url atau env DATABASE_URL harus diisi")
+
+    tahun_ini = datetime.now().year
+    if args.tahun and any(t >= tahun_ini for t in args.tahun):
+        parser.error("Hanya tahun yang sudah tutup (sebelum tahun ini) yang bisa diarsipkan")
+
+    conn = psycopg2.connect(args.database_url)
+    try:
+        cur = conn.cursor()
+        cur.execute(CREATE_RINGKASAN_ARSIP)
+        conn.commit()
+
+        pulihkan_staging(conn, args.arsip_path)
+
+        daftar_tahun = args.tahun
+        if not daftar_tahun:
+            cur.execute(
+                "SELECT DISTINCT EXTRACT(YEAR FROM tanggal)::int FROM pemasukan WHERE tanggal < %s "
+                "UNION SELECT DISTINCT EXTRACT(YEAR FROM tanggal)::int FROM pengeluaran WHERE tanggal < %s",
+                (date(tahun_ini, 1, 1), date(tahun_ini, 1, 1))
+            )
+            daftar_tahun = sorted(r[0] for r in cur.fetchall())
+        cur.close()
+
+        for tahun in daftar_tahun:
+            for tabel in TABEL_ARSIP:
+                try:
+                    jumlah = arsipkan_tahun(conn, tabel, tahun, args.arsip_path)
+                    print(f"{tabel} {tahun}: {jumlah} baris diarsipkan")
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Error mengarsipkan {tabel} {tahun}: {e}")
+    finally:
+        conn.close()
+
+    print("Arsip selesai. Jalankan VACUUM pada pemasukan dan pengeluaran untuk mengembalikan ruang.")
+
+
+if __name__ == "__main__":
+    main()
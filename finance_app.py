@@ -1,10 +1,24 @@
 import streamlit as st
 import psycopg2
-from datetime import datetime, date
+from psycopg2.extras import execute_values
+from datetime import datetime, date, timedelta
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import locale
+import logging
+import os
+import random
 import re
+import json
+import select
+import threading
+import time
+
+from archive_data import CREATE_RINGKASAN_ARSIP, ARSIP_PATH_DEFAULT, CHANNEL_PERUBAHAN, baca_arsip
+from profiler import SamplingProfiler
+
+logger = logging.getLogger(__name__)
 
 # Set locale untuk format angka Indonesia
 try:
@@ -25,6 +39,24 @@ DB_CONFIG = {
     "password": st.secrets["db"]["DB_PASSWORD"]
 }
 
+def baca_replica_urls(nilai):
+    """REPLICA_URLS boleh berupa satu DSN (string) atau list DSN"""
+    if isinstance(nilai, str):
+        return [nilai] if nilai.strip() else []
+    if isinstance(nilai, (list, tuple)) and all(isinstance(dsn, str) for dsn in nilai):
+        return [dsn for dsn in nilai if dsn.strip()]
+    raise ValueError("REPLICA_URLS harus berupa string DSN atau list string DSN")
+
+# Replika baca (opsional): query laporan diarahkan ke sini, penulisan tetap ke DATABASE_URL
+REPLICA_URLS = baca_replica_urls(st.secrets["db"].get("REPLICA_URLS", []))
+# Lag replikasi maksimum (detik) agar replika masih dipakai
+REPLICA_MAX_LAG = float(st.secrets["db"].get("REPLICA_MAX_LAG", 10))
+# Status replika dianggap segar selama interval ini (detik)
+REPLICA_CEK_INTERVAL = 2
+
+# Lokasi arsip Parquet untuk tahun yang sudah tutup (lihat archive_data.py)
+ARSIP_PATH = st.secrets.get("arsip", {}).get("ARSIP_PATH", ARSIP_PATH_DEFAULT)
+
 # Fungsi untuk format angka dengan titik sebagai pemisah ribuan
 def format_angka(angka):
     try:
@@ -98,6 +130,107 @@ def get_connection():
         st.error(f"❌ Error connecting to database: {e}")
         return None
 
+def parse_lsn(lsn):
+    """Ubah LSN Postgres 'X/Y' menjadi integer agar bisa dibandingkan"""
+    hi, lo = lsn.split("/")
+    return (int(hi, 16) << 32) + int(lo, 16)
+
+@st.cache_resource
+def _status_replika():
+    """Status terakhir tiap replika (lsn, lag, waktu cek), dibagi semua sesi dalam proses ini"""
+    return {"lock": threading.Lock(), "replika": {}}
+
+def _cek_replika(dsn, conn):
+    """Ambil posisi replay dan lag replika lalu simpan ke status"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT pg_is_in_recovery(),
+               COALESCE(pg_last_wal_replay_lsn()::text, '0/0'),
+               CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+               END
+    """)
+    in_recovery, lsn, lag = cur.fetchone()
+    cur.close()
+    # Bukan standby (mis. DSN menunjuk ke primary): selalu mutakhir
+    status = {"lsn": parse_lsn(lsn) if in_recovery else float("inf"),
+              "lag": float(lag) if in_recovery else 0.0,
+              "waktu": time.monotonic()}
+    store = _status_replika()
+    with store["lock"]:
+        store["replika"][dsn] = status
+    return status
+
+def lsn_dibutuhkan():
+    """Posisi WAL minimum yang harus sudah di-replay replika untuk sesi ini.
+    
+    Gabungan penulisan terakhir sesi ini (read-your-writes) dan perubahan
+    terakhir yang diketahui proses ini lewat notifikasi, agar hasil yang
+    di-cache tidak berasal dari replika yang tertinggal.
+    """
+    # Posisi penulisan terakhir tidak diketahui: pakai primary sampai lag maksimum terlewati
+    tulis_tanpa_lsn = st.session_state.get("_tulis_tanpa_lsn")
+    if tulis_tanpa_lsn is not None and time.monotonic() - tulis_tanpa_lsn < REPLICA_MAX_LAG:
+        return float("inf")
+    return max(st.session_state.get("_lsn_tulis", 0), _versi_data()["lsn"])
+
+def get_read_connection():
+    """Koneksi untuk query baca: replika yang cukup mutakhir, atau primary sebagai fallback"""
+    if not REPLICA_URLS:
+        return get_connection()
+    
+    lsn_perlu = lsn_dibutuhkan()
+    if lsn_perlu == float("inf"):
+        # LSN tulisan terakhir tidak diketahui: tidak ada replika yang bisa dipastikan cukup mutakhir
+        return get_connection()
+    store = _status_replika()
+    
+    for dsn in random.sample(REPLICA_URLS, len(REPLICA_URLS)):
+        with store["lock"]:
+            status = store["replika"].get(dsn)
+        segar = status is not None and time.monotonic() - status["waktu"] < REPLICA_CEK_INTERVAL
+        
+        # Replika yang baru gagal atau lag-nya terlalu besar dilewati sampai dicek ulang
+        if segar and (status.get("gagal") or status["lag"] > REPLICA_MAX_LAG):
+            continue
+        
+        try:
+            conn = psycopg2.connect(dsn, connect_timeout=3)
+        except Exception:
+            with store["lock"]:
+                store["replika"][dsn] = {"gagal": True, "waktu": time.monotonic()}
+            continue
+        
+        try:
+            if not segar or status["lsn"] < lsn_perlu:
+                status = _cek_replika(dsn, conn)
+            if status["lag"] <= REPLICA_MAX_LAG and status["lsn"] >= lsn_perlu:
+                return conn
+        except Exception:
+            with store["lock"]:
+                store["replika"][dsn] = {"gagal": True, "waktu": time.monotonic()}
+        conn.close()
+    
+    return get_connection()
+
+def catat_lsn_tulis(cur):
+    """Simpan posisi WAL setelah commit agar pembacaan berikutnya sesi ini tidak stale.
+    
+    Dipanggil setelah commit, jadi kegagalan di sini tidak boleh membuat
+    penulisan yang sudah tersimpan dilaporkan gagal.
+    """
+    if not REPLICA_URLS:
+        return
+    
+    try:
+        lsn = _lsn_primary(cur)
+    except Exception as e:
+        logger.warning("Gagal membaca posisi WAL setelah commit: %s", e)
+        st.session_state["_tulis_tanpa_lsn"] = time.monotonic()
+        return
+    st.session_state["_lsn_tulis"] = max(st.session_state.get("_lsn_tulis", 0), lsn)
+    _catat_lsn_proses(_versi_data(), lsn)
+
 # Create tables if they don't exist
 def create_tables():
     """Create tables if they don't exist"""
@@ -128,6 +261,8 @@ def create_tables():
             )
         """)
         
+        cur.execute(CREATE_RINGKASAN_ARSIP)
+        
         conn.commit()
         cur.close()
     except Exception as e:
@@ -135,10 +270,18 @@ def create_tables():
     finally:
         conn.close()
 
-def execute_query(query, params=None, fetch=False):
-    """Execute database query with proper connection handling"""
-    conn = get_connection()
+def execute_query(query, params=None, fetch=False, raise_error=False):
+    """Execute database query with proper connection handling.
+    
+    Query baca (fetch=True) diarahkan ke replika jika dikonfigurasi,
+    query tulis selalu ke primary. Dengan raise_error=True error tidak
+    ditampilkan tetapi diteruskan ke pemanggil (dipakai fungsi yang di-cache
+    agar kegagalan tidak tersimpan sebagai "tidak ada data").
+    """
+    conn = get_read_connection() if fetch else get_connection()
     if not conn:
+        if raise_error:
+            raise psycopg2.OperationalError("Tidak dapat terhubung ke database")
         return None
     
     try:
@@ -149,18 +292,187 @@ def execute_query(query, params=None, fetch=False):
             result = cur.fetchall()
         else:
             conn.commit()
+            catat_lsn_tulis(cur)
             result = None
         
         cur.close()
         return result
         
     except Exception as e:
+        if raise_error:
+            raise
+        st.error(f"❌ Database error: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+def execute_many(query, rows):
+    """Execute multi-row INSERT with execute_values in a single transaction"""
+    conn = get_connection()
+    if not conn:
+        return None
+    
+    try:
+        cur = conn.cursor()
+        execute_values(cur, query, rows)
+        conn.commit()
+        catat_lsn_tulis(cur)
+        cur.close()
+        return len(rows)
+        
+    except Exception as e:
+        conn.rollback()
         st.error(f"❌ Database error: {e}")
         return None
     finally:
         if conn:
             conn.close()
 
+# Cache hasil query laporan; entri lama tidak terpakai lagi begitu versinya naik
+CACHE_TTL = 600
+CACHE_MAX_ENTRIES = 500
+# Selama listener belum berjalan, cache hanya berlaku sependek ini (detik)
+CACHE_TTL_TANPA_LISTENER = 10
+
+@st.cache_resource
+def _versi_data():
+    """Nomor versi data per (tabel, tahun, bulan), dibagi semua sesi dalam proses ini"""
+    # lsn: posisi WAL primary terakhir yang diketahui telah mengubah data
+    # listener_aktif: True selama thread listener tersambung dan LISTEN
+    return {"lock": threading.Lock(), "epoch": 0, "global": 0, "bulan": {}, "lsn": 0,
+            "listener_aktif": False}
+
+def listener_aktif():
+    """Apakah notifikasi perubahan dari proses lain sedang diterima"""
+    return _versi_data()["listener_aktif"]
+
+def versi_data(tabel=None, tahun=None, bulan=None):
+    """Versi data untuk dipakai sebagai bagian kunci cache.
+    
+    Tanpa argumen mengembalikan versi global (berubah pada setiap perubahan),
+    tanpa bulan mengembalikan versi ke-12 bulan dalam satu tahun.
+    Tanpa listener yang aktif perubahan dari proses lain tidak terlihat,
+    jadi versi ikut berganti setiap CACHE_TTL_TANPA_LISTENER detik.
+    """
+    store = _versi_data()
+    with store["lock"]:
+        segmen = None if store["listener_aktif"] else int(time.monotonic() // CACHE_TTL_TANPA_LISTENER)
+        if tabel is None:
+            return (store["epoch"], segmen, store["global"])
+        if bulan is None:
+            return (store["epoch"], segmen, tuple(store["bulan"].get((tabel, tahun, b), 0) for b in range(1, 13)))
+        return (store["epoch"], segmen, store["bulan"].get((tabel, tahun, bulan), 0))
+
+def _naikkan_versi(store, tabel, tahun, bulan):
+    with store["lock"]:
+        key = (tabel, tahun, bulan)
+        store["bulan"][key] = store["bulan"].get(key, 0) + 1
+        store["global"] += 1
+
+def _catat_lsn_proses(store, lsn):
+    with store["lock"]:
+        store["lsn"] = max(store["lsn"], lsn)
+
+def _lsn_primary(cur):
+    cur.execute("SELECT pg_current_wal_lsn()::text")
+    return parse_lsn(cur.fetchone()[0])
+
+def tandai_perubahan(tabel, tahun, bulan):
+    """Tandai data satu bulan berubah di proses ini tanpa menunggu notifikasi"""
+    _naikkan_versi(_versi_data(), tabel, int(tahun), int(bulan))
+
+def _dengarkan_perubahan(dsn, store):
+    """Loop thread listener: LISTEN perubahan_data dan naikkan versi bulan yang berubah"""
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {CHANNEL_PERUBAHAN}")
+            
+            # Notifikasi selama terputus tidak diketahui, jadi semua cache dianggap basi
+            if REPLICA_URLS:
+                _catat_lsn_proses(store, _lsn_primary(cur))
+            with store["lock"]:
+                store["epoch"] += 1
+                store["listener_aktif"] = True
+            
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                # Catat posisi WAL sebelum versi dinaikkan, agar query yang mengisi
+                # ulang cache tidak membaca replika yang belum menerima perubahan ini
+                if conn.notifies and REPLICA_URLS:
+                    _catat_lsn_proses(store, _lsn_primary(cur))
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        data = json.loads(notify.payload)
+                        _naikkan_versi(store, data["tabel"], data["tahun"], data["bulan"])
+                    except (ValueError, KeyError):
+                        with store["lock"]:
+                            store["epoch"] += 1
+        except Exception as e:
+            with store["lock"]:
+                store["listener_aktif"] = False
+            logger.warning("Listener perubahan data terputus: %s", e)
+            time.sleep(5)
+        finally:
+            if conn:
+                conn.close()
+
+@st.cache_resource
+def siapkan_notifikasi():
+    """Pasang trigger NOTIFY pada tabel transaksi dan jalankan thread listener (sekali per proses).
+    
+    Error diteruskan ke pemanggil supaya tidak di-cache dan rerun berikutnya mencoba lagi.
+    """
+    conn = psycopg2.connect(st.secrets["db"]["DATABASE_URL"])
+    try:
+        cur = conn.cursor()
+        
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION notify_perubahan_data() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    PERFORM pg_notify('{CHANNEL_PERUBAHAN}', json_build_object(
+                        'tabel', TG_TABLE_NAME,
+                        'tahun', EXTRACT(YEAR FROM NEW.tanggal)::int,
+                        'bulan', EXTRACT(MONTH FROM NEW.tanggal)::int)::text);
+                END IF;
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    PERFORM pg_notify('{CHANNEL_PERUBAHAN}', json_build_object(
+                        'tabel', TG_TABLE_NAME,
+                        'tahun', EXTRACT(YEAR FROM OLD.tanggal)::int,
+                        'bulan', EXTRACT(MONTH FROM OLD.tanggal)::int)::text);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        
+        for tabel in ("pemasukan", "pengeluaran"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {tabel}_notify_perubahan ON {tabel}")
+            cur.execute(f"""
+                CREATE TRIGGER {tabel}_notify_perubahan
+                AFTER INSERT OR UPDATE OR DELETE ON {tabel}
+                FOR EACH ROW EXECUTE FUNCTION notify_perubahan_data()
+            """)
+        
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+    
+    listener = threading.Thread(target=_dengarkan_perubahan,
+                                args=(st.secrets["db"]["DATABASE_URL"], _versi_data()),
+                                name="listener-perubahan-data", daemon=True)
+    listener.start()
+    return listener
+
 def show_dashboard():
     st.header("📊 Dashboard Keuangan")
     
@@ -170,21 +482,18 @@ def show_dashboard():
         current_month = now.month
         current_year = now.year
         
-        # Calculate total pemasukan this month
-        pemasukan_result = execute_query(
-            "SELECT COALESCE(SUM(jumlah), 0) FROM pemasukan WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s",
-            (current_month, current_year),
-            fetch=True
+        # Ringkasan per jenis bulan ini (dipakai untuk total dan grafik)
+        pemasukan_data = ambil_ringkasan_jenis(
+            "pemasukan", current_year, current_month,
+            versi=versi_data("pemasukan", current_year, current_month)
         )
-        total_pemasukan = pemasukan_result[0][0] if pemasukan_result else 0
-        
-        # Calculate total pengeluaran this month
-        pengeluaran_result = execute_query(
-            "SELECT COALESCE(SUM(jumlah), 0) FROM pengeluaran WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s",
-            (current_month, current_year),
-            fetch=True
+        pengeluaran_data = ambil_ringkasan_jenis(
+            "pengeluaran", current_year, current_month,
+            versi=versi_data("pengeluaran", current_year, current_month)
         )
-        total_pengeluaran = pengeluaran_result[0][0] if pengeluaran_result else 0
+        
+        total_pemasukan = sum([p[1] for p in pemasukan_data])
+        total_pengeluaran = sum([p[1] for p in pengeluaran_data])
         
         # Calculate saldo
         saldo = total_pemasukan - total_pengeluaran
@@ -196,24 +505,11 @@ def show_dashboard():
         col3.metric("✅ Saldo Bulan Ini", format_angka(saldo),
                     f"{'Surplus' if saldo >= 0 else 'Defisit'}")
         
-        # Get data for charts
-        pemasukan_data = execute_query(
-            "SELECT jenis, SUM(jumlah) FROM pemasukan WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s GROUP BY jenis",
-            (current_month, current_year),
-            fetch=True
-        ) or []
-        
-        pengeluaran_data = execute_query(
-            "SELECT jenis, SUM(jumlah) FROM pengeluaran WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s GROUP BY jenis",
-            (current_month, current_year),
-            fetch=True
-        ) or []
-        
         # Create charts
         col1, col2 = st.columns(2)
         
         if pemasukan_data:
-            df_pemasukan = pd.DataFrame(pemasukan_data, columns=['Jenis', 'Jumlah'])
+            df_pemasukan = pd.DataFrame([p[:2] for p in pemasukan_data], columns=['Jenis', 'Jumlah'])
             fig_pemasukan = px.pie(df_pemasukan, values='Jumlah', names='Jenis',
                                    title='📈 Komposisi Pemasukan', hole=0.4)
             col1.plotly_chart(fig_pemasukan, use_container_width=True)
@@ -221,7 +517,7 @@ def show_dashboard():
             col1.info("📝 Belum ada data pemasukan bulan ini")
         
         if pengeluaran_data:
-            df_pengeluaran = pd.DataFrame(pengeluaran_data, columns=['Jenis', 'Jumlah'])
+            df_pengeluaran = pd.DataFrame([p[:2] for p in pengeluaran_data], columns=['Jenis', 'Jumlah'])
             fig_pengeluaran = px.pie(df_pengeluaran, values='Jumlah', names='Jenis',
                                      title='📉 Komposisi Pengeluaran', hole=0.4)
             col2.plotly_chart(fig_pengeluaran, use_container_width=True)
@@ -274,6 +570,7 @@ def input_pemasukan():
                         "INSERT INTO pemasukan (jenis, keterangan, jumlah, tanggal) VALUES (%s, %s, %s, %s)",
                         (jenis, keterangan, jumlah, tanggal)
                     )
+                    tandai_perubahan("pemasukan", tanggal.year, tanggal.month)
                     st.success("✅ Pemasukan berhasil dicatat!")
                     # Reset input
                     st.session_state.pemasukan_jumlah = ""
@@ -324,6 +621,7 @@ def input_pengeluaran():
                         "INSERT INTO pengeluaran (jenis, keterangan, jumlah, tanggal) VALUES (%s, %s, %s, %s)",
                         (jenis, keterangan, jumlah, tanggal)
                     )
+                    tandai_perubahan("pengeluaran", tanggal.year, tanggal.month)
                     st.success("✅ Pengeluaran berhasil dicatat!")
                     # Reset input
                     st.session_state.pengeluaran_jumlah = ""
@@ -334,6 +632,12 @@ def input_pengeluaran():
 def kalkulator_truck():
     st.header("🚛 Kalkulator Truck")
     
+    mode = st.radio("Mode Input", ["Satu Perjalanan", "Banyak Perjalanan"],
+                    horizontal=True, key="truck_mode")
+    if mode == "Banyak Perjalanan":
+        kalkulator_truck_batch()
+        return
+    
     st.info("💡 Ketik angka dan akan otomatis diformat dengan koma. Hasil perhitungan akan ditampilkan secara otomatis setelah input diisi.")
     
     col1, col2 = st.columns(2)
@@ -410,6 +714,7 @@ def kalkulator_truck():
                              keterangan_custom,
                              total)
                         )
+                        tandai_perubahan("pemasukan", date.today().year, date.today().month)
                         st.success("✅ Pendapatan truck berhasil dicatat!")
                         # Clear inputs
                         st.session_state.berangkat = ""
@@ -421,6 +726,98 @@ def kalkulator_truck():
         else:
             st.warning("⚠️ Silakan isi semua field jumlah untuk melihat perhitungan.")
 
+# Jumlah baris kosong awal pada grid perjalanan
+BARIS_GRID_TRUCK = 10
+
+def kalkulator_truck_batch():
+    st.info("💡 Isi atau tempel (paste) banyak perjalanan sekaligus dari spreadsheet. Total dihitung otomatis: Berangkat + Pulang - Sangu Supir.")
+    
+    # Versi grid dinaikkan setelah simpan agar grid kembali kosong
+    if "truck_grid_versi" not in st.session_state:
+        st.session_state.truck_grid_versi = 0
+    
+    grid_awal = pd.DataFrame({
+        'Tanggal': [date.today()] * BARIS_GRID_TRUCK,
+        'Berangkat': pd.Series([None] * BARIS_GRID_TRUCK, dtype='Int64'),
+        'Pulang': pd.Series([None] * BARIS_GRID_TRUCK, dtype='Int64'),
+        'Sangu Supir': pd.Series([None] * BARIS_GRID_TRUCK, dtype='Int64'),
+        'Keterangan': [""] * BARIS_GRID_TRUCK
+    })
+    
+    grid = st.data_editor(
+        grid_awal,
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+        key=f"truck_grid_{st.session_state.truck_grid_versi}",
+        column_config={
+            "Tanggal": st.column_config.DateColumn("Tanggal", format="DD/MM/YYYY"),
+            "Berangkat": st.column_config.NumberColumn("Berangkat", min_value=0, step=1, format="%d"),
+            "Pulang": st.column_config.NumberColumn("Pulang", min_value=0, step=1, format="%d"),
+            "Sangu Supir": st.column_config.NumberColumn("Sangu Supir", min_value=0, step=1, format="%d"),
+            "Keterangan": st.column_config.TextColumn("Keterangan")
+        }
+    )
+    
+    # Perhitungan vectorized untuk seluruh grid
+    angka = grid[['Berangkat', 'Pulang', 'Sangu Supir']].apply(pd.to_numeric, errors='coerce').fillna(0).astype('int64')
+    keterangan = grid['Keterangan'].fillna("").astype(str).str.strip()
+    
+    # Abaikan baris yang belum diisi sama sekali
+    terisi = angka.gt(0).any(axis=1) | keterangan.ne("")
+    angka = angka[terisi]
+    keterangan = keterangan[terisi]
+    tanggal = grid.loc[terisi, 'Tanggal']
+    
+    if angka.empty:
+        st.warning("⚠️ Silakan isi minimal satu perjalanan.")
+        return
+    
+    total = angka['Berangkat'] + angka['Pulang'] - angka['Sangu Supir']
+    
+    # Validasi per baris, setiap kolom bernilai True jika baris bermasalah
+    masalah = pd.DataFrame({
+        "Berangkat/Pulang/Sangu harus > 0": angka.le(0).any(axis=1),
+        "Keterangan kosong": keterangan.eq(""),
+        "Tanggal kosong": tanggal.isna()
+    })
+    status = masalah.dot(masalah.columns + "; ").str.rstrip("; ").replace("", "✅ OK")
+    valid = ~masalah.any(axis=1)
+    
+    st.subheader("Perhitungan")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Perjalanan Valid", f"{int(valid.sum())} / {len(valid)}")
+    col2.metric("Total Pendapatan", format_angka(int(total[valid].sum())))
+    col3.metric("Total Sangu Supir", format_angka(int(angka.loc[valid, 'Sangu Supir'].sum())))
+    
+    df_preview = pd.DataFrame({
+        'Tanggal': tanggal,
+        'Keterangan': keterangan,
+        'Total': total.apply(format_angka),
+        'Status': status
+    })
+    st.dataframe(df_preview, use_container_width=True, hide_index=True)
+    
+    if not valid.all():
+        st.error(f"❌ {int((~valid).sum())} baris belum valid, perbaiki sebelum menyimpan")
+    
+    if st.button(f"💰 Masukkan {len(valid)} Perjalanan ke Pendapatan Truck", disabled=not valid.all()):
+        rows = [("Pemasukan Truck", k, int(t), tgl)
+                for k, t, tgl in zip(keterangan, total, tanggal)]
+        try:
+            disimpan = execute_many(
+                "INSERT INTO pemasukan (jenis, keterangan, jumlah, tanggal) VALUES %s",
+                rows
+            )
+            if disimpan:
+                for tgl in set(tanggal):
+                    tandai_perubahan("pemasukan", tgl.year, tgl.month)
+                st.success(f"✅ {disimpan} pendapatan truck berhasil dicatat!")
+                st.session_state.truck_grid_versi += 1
+                st.rerun()
+        except Exception as e:
+            st.error(f"❌ Error menyimpan pendapatan truck: {e}")
+
 def laporan_keuangan():
     st.header("📋 Laporan Keuangan Bulanan")
     
@@ -436,18 +833,12 @@ def laporan_keuangan():
     
     try:
         # Get pemasukan data
-        pemasukan_data = execute_query(
-            "SELECT id, jenis, keterangan, jumlah, tanggal FROM pemasukan WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s ORDER BY tanggal DESC",
-            (bulan, tahun),
-            fetch=True
-        ) or []
+        pemasukan_data = ambil_transaksi_bulanan("pemasukan", tahun, bulan,
+                                                 versi=versi_data("pemasukan", tahun, bulan))
         
         # Get pengeluaran data
-        pengeluaran_data = execute_query(
-            "SELECT id, jenis, keterangan, jumlah, tanggal FROM pengeluaran WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s ORDER BY tanggal DESC",
-            (bulan, tahun),
-            fetch=True
-        ) or []
+        pengeluaran_data = ambil_transaksi_bulanan("pengeluaran", tahun, bulan,
+                                                   versi=versi_data("pengeluaran", tahun, bulan))
         
         # Calculate totals
         total_pemasukan = sum([p[3] for p in pemasukan_data]) if pemasukan_data else 0
@@ -492,6 +883,136 @@ def laporan_keuangan():
     except Exception as e:
         st.error(f"❌ Error loading report data: {e}")
 
+# Jumlah baris detail yang dimuat per klik "Tampilkan lebih banyak"
+DETAIL_PER_HALAMAN = 50
+# Jumlah jenis teratas yang ditampilkan pada ringkasan bulanan
+TOP_JENIS = 5
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def ambil_ringkasan_jenis(tabel, tahun, bulan, versi=None):
+    """Ambil total, banyak transaksi dan banyak transaksi arsip per jenis untuk satu bulan"""
+    return execute_query(f"""
+        SELECT jenis, SUM(total)::bigint as total, SUM(banyak)::bigint as banyak,
+               SUM(banyak_arsip)::bigint as banyak_arsip
+        FROM (
+            SELECT jenis, SUM(jumlah) as total, COUNT(*) as banyak, 0 as banyak_arsip
+            FROM {tabel}
+            WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s
+            GROUP BY jenis
+            UNION ALL
+            SELECT jenis, total, banyak, banyak
+            FROM ringkasan_arsip
+            WHERE tabel = %s AND bulan = %s AND tahun = %s
+        ) t
+        GROUP BY jenis
+        ORDER BY total DESC
+    """, (bulan, tahun, tabel, bulan, tahun), fetch=True, raise_error=True)
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def ambil_detail_transaksi(tabel, tahun, bulan, limit, dengan_arsip=False, versi=None):
+    """Ambil transaksi terbaru satu bulan, dibatasi sebanyak limit baris"""
+    detail = execute_query(
+        f"SELECT jenis, keterangan, jumlah, tanggal FROM {tabel} WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s ORDER BY tanggal DESC, id DESC LIMIT %s",
+        (bulan, tahun, limit),
+        fetch=True,
+        raise_error=True
+    )
+    
+    if dengan_arsip:
+        df_arsip = baca_arsip(ARSIP_PATH, tabel, tahun, bulan).head(limit)
+        arsip = list(df_arsip[['jenis', 'keterangan', 'jumlah', 'tanggal']].itertuples(index=False, name=None))
+        detail = sorted(detail + arsip, key=lambda d: d[3], reverse=True)[:limit]
+    
+    return detail
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def ambil_transaksi_bulanan(tabel, tahun, bulan, versi=None):
+    """Ambil semua transaksi satu bulan, termasuk transaksi yang sudah diarsipkan"""
+    data = execute_query(
+        f"SELECT id, jenis, keterangan, jumlah, tanggal FROM {tabel} WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s ORDER BY tanggal DESC",
+        (bulan, tahun),
+        fetch=True,
+        raise_error=True
+    )
+    
+    diarsipkan = execute_query(
+        "SELECT EXISTS (SELECT 1 FROM ringkasan_arsip WHERE tabel = %s AND tahun = %s AND bulan = %s)",
+        (tabel, tahun, bulan),
+        fetch=True,
+        raise_error=True
+    )
+    if diarsipkan[0][0]:
+        df_arsip = baca_arsip(ARSIP_PATH, tabel, tahun, bulan)
+        arsip = list(df_arsip[['id', 'jenis', 'keterangan', 'jumlah', 'tanggal']].itertuples(index=False, name=None))
+        data = sorted(data + arsip, key=lambda d: d[4], reverse=True)
+    
+    return data
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def ambil_total_per_bulan(tabel, tahun, versi=None):
+    """Ambil total per bulan dalam satu tahun, termasuk rollup arsip"""
+    return execute_query(f"""
+        SELECT bulan::int, SUM(total)::bigint as total
+        FROM (
+            SELECT EXTRACT(MONTH FROM tanggal) as bulan, COALESCE(SUM(jumlah), 0) as total
+            FROM {tabel}
+            WHERE EXTRACT(YEAR FROM tanggal) = %s
+            GROUP BY EXTRACT(MONTH FROM tanggal)
+            UNION ALL
+            SELECT bulan, SUM(total) as total
+            FROM ringkasan_arsip
+            WHERE tabel = %s AND tahun = %s
+            GROUP BY bulan
+        ) t
+        GROUP BY bulan
+        ORDER BY bulan
+    """, (tahun, tabel, tahun), fetch=True, raise_error=True)
+
+def tampilkan_detail_bulanan(tabel, tahun, bulan, label_total, pesan_kosong):
+    """Tampilkan ringkasan top jenis dan tabel detail transaksi satu bulan"""
+    versi = versi_data(tabel, tahun, bulan)
+    try:
+        ringkasan = ambil_ringkasan_jenis(tabel, tahun, bulan, versi=versi)
+    except Exception as e:
+        st.error(f"❌ Database error: {e}")
+        return
+    
+    if not ringkasan:
+        st.info(pesan_kosong)
+        return
+    
+    total_bulan = sum([r[1] for r in ringkasan])
+    banyak_transaksi = sum([r[2] for r in ringkasan])
+    banyak_arsip = sum([r[3] for r in ringkasan])
+    st.metric(label_total, format_angka(total_bulan))
+    
+    # Ringkasan top-N jenis, sisanya digabung menjadi "Lainnya"
+    df_jenis = pd.DataFrame([r[:3] for r in ringkasan[:TOP_JENIS]], columns=['Jenis', 'Jumlah', 'Transaksi'])
+    if len(ringkasan) > TOP_JENIS:
+        sisa = ringkasan[TOP_JENIS:]
+        df_jenis.loc[len(df_jenis)] = ['Lainnya', sum([r[1] for r in sisa]), sum([r[2] for r in sisa])]
+    df_jenis['Jumlah'] = df_jenis['Jumlah'].apply(format_angka)
+    st.dataframe(df_jenis, use_container_width=True, hide_index=True)
+    
+    # Detail transaksi dalam satu tabel, dimuat bertahap
+    key_limit = f"detail_{tabel}_{tahun}_{bulan}"
+    limit = st.session_state.get(key_limit, DETAIL_PER_HALAMAN)
+    try:
+        detail = ambil_detail_transaksi(tabel, tahun, bulan, limit, dengan_arsip=banyak_arsip > 0, versi=versi)
+    except Exception as e:
+        st.error(f"❌ Database error: {e}")
+        return
+    
+    df_detail = pd.DataFrame(detail, columns=['Jenis', 'Keterangan', 'Jumlah', 'Tanggal'])
+    df_detail['Jumlah'] = df_detail['Jumlah'].apply(format_angka)
+    st.dataframe(df_detail, use_container_width=True, hide_index=True, height=300)
+    st.caption(f"Menampilkan {len(detail)} dari {banyak_transaksi} transaksi")
+    
+    if len(detail) < banyak_transaksi:
+        if st.button("⬇️ Tampilkan lebih banyak", key=f"{key_limit}_lebih"):
+            st.session_state[key_limit] = limit + DETAIL_PER_HALAMAN
+            st.rerun()
+
 def laporan_tahunan():
     st.header("📊 Laporan Tahunan")
     
@@ -501,24 +1022,12 @@ def laporan_tahunan():
     
     try:
         # Get pemasukan data per bulan
-        pemasukan_per_bulan = execute_query("""
-            SELECT EXTRACT(MONTH FROM tanggal) as bulan,
-                   COALESCE(SUM(jumlah), 0) as total
-            FROM pemasukan
-            WHERE EXTRACT(YEAR FROM tanggal) = %s
-            GROUP BY EXTRACT(MONTH FROM tanggal)
-            ORDER BY bulan
-        """, (tahun,), fetch=True) or []
+        pemasukan_per_bulan = ambil_total_per_bulan("pemasukan", tahun,
+                                              versi=versi_data("pemasukan", tahun))
         
         # Get pengeluaran data per bulan
-        pengeluaran_per_bulan = execute_query("""
-            SELECT EXTRACT(MONTH FROM tanggal) as bulan,
-                   COALESCE(SUM(jumlah), 0) as total
-            FROM pengeluaran
-            WHERE EXTRACT(YEAR FROM tanggal) = %s
-            GROUP BY EXTRACT(MONTH FROM tanggal)
-            ORDER BY bulan
-        """, (tahun,), fetch=True) or []
+        pengeluaran_per_bulan = ambil_total_per_bulan("pengeluaran", tahun,
+                                              versi=versi_data("pengeluaran", tahun))
         
         # Create data for chart
         bulan_list = list(range(1, 13))
@@ -587,47 +1096,178 @@ def laporan_tahunan():
                 
                 with col1:
                     st.subheader("💰 Pemasukan")
-                    pemasukan_detail = execute_query(
-                        "SELECT jenis, keterangan, jumlah, tanggal FROM pemasukan WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s ORDER BY tanggal DESC",
-                        (bulan_num, tahun),
-                        fetch=True
-                    ) or []
-                    
-                    if pemasukan_detail:
-                        total_bulan = sum([p[2] for p in pemasukan_detail])
-                        st.metric("Total Pemasukan", format_angka(total_bulan))
-                        
-                        for p in pemasukan_detail:
-                            st.write(f"**{p[0]}**")
-                            st.write(f"{format_angka(p[2])} - {p[1]}")
-                            st.caption(f"Tanggal: {p[3].strftime('%d %b %Y')}")
-                            st.divider()
-                    else:
-                        st.info("Tidak ada pemasukan")
+                    tampilkan_detail_bulanan("pemasukan", tahun, bulan_num,
+                                             "Total Pemasukan", "Tidak ada pemasukan")
                 
                 with col2:
                     st.subheader("💸 Pengeluaran")
-                    pengeluaran_detail = execute_query(
-                        "SELECT jenis, keterangan, jumlah, tanggal FROM pengeluaran WHERE EXTRACT(MONTH FROM tanggal) = %s AND EXTRACT(YEAR FROM tanggal) = %s ORDER BY tanggal DESC",
-                        (bulan_num, tahun),
-                        fetch=True
-                    ) or []
-                    
-                    if pengeluaran_detail:
-                        total_bulan = sum([p[2] for p in pengeluaran_detail])
-                        st.metric("Total Pengeluaran", format_angka(total_bulan))
-                        
-                        for p in pengeluaran_detail:
-                            st.write(f"**{p[0]}**")
-                            st.write(f"{format_angka(p[2])} - {p[1]}")
-                            st.caption(f"Tanggal: {p[3].strftime('%d %b %Y')}")
-                            st.divider()
-                    else:
-                        st.info("Tidak ada pengeluaran")
+                    tampilkan_detail_bulanan("pengeluaran", tahun, bulan_num,
+                                             "Total Pengeluaran", "Tidak ada pengeluaran")
         
     except Exception as e:
         st.error(f"❌ Error loading annual report: {e}")
 
+# Grain laporan periode: label tampilan dan interval untuk generate_series
+GRAIN_LAPORAN = {
+    "day": ("Harian", "1 day"),
+    "week": ("Mingguan", "1 week"),
+    "month": ("Bulanan", "1 month"),
+    "quarter": ("Kuartalan", "3 months"),
+    "year": ("Tahunan", "1 year")
+}
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def ambil_laporan_periode(tanggal_awal, tanggal_akhir, grain, versi=None):
+    """Hitung total per jenis, per arus dan saldo untuk setiap periode beserta
+    selisih terhadap periode sebelumnya dalam satu query.
+    
+    Hasilnya DataFrame tidy dengan kolom Periode, Arus, Jenis, Total,
+    Transaksi, Delta dan Delta %. Baris Jenis 'Total' adalah total per arus,
+    baris Arus 'Saldo' adalah pemasukan dikurangi pengeluaran.
+    """
+    if grain not in GRAIN_LAPORAN:
+        raise ValueError(f"Grain tidak dikenal: {grain}")
+    
+    params = {
+        "awal": tanggal_awal,
+        "akhir": tanggal_akhir,
+        "grain": grain,
+        "interval": GRAIN_LAPORAN[grain][1],
+        # Rollup arsip hanya per bulan, jadi tidak bisa dipecah ke hari atau minggu
+        "dengan_arsip": grain in ("month", "quarter", "year")
+    }
+    
+    result = execute_query("""
+        WITH transaksi AS (
+            SELECT 'Pemasukan' AS arus, jenis, jumlah::bigint AS jumlah, 1 AS banyak, tanggal
+            FROM pemasukan
+            WHERE tanggal BETWEEN %(awal)s AND %(akhir)s
+            UNION ALL
+            SELECT 'Pengeluaran', jenis, jumlah::bigint, 1, tanggal
+            FROM pengeluaran
+            WHERE tanggal BETWEEN %(awal)s AND %(akhir)s
+            UNION ALL
+            SELECT CASE tabel WHEN 'pemasukan' THEN 'Pemasukan' ELSE 'Pengeluaran' END,
+                   jenis, total, banyak, make_date(tahun, bulan, 1)
+            FROM ringkasan_arsip
+            WHERE %(dengan_arsip)s
+              -- Hanya bulan arsip yang seluruhnya berada di dalam rentang
+              AND make_date(tahun, bulan, 1) >= %(awal)s
+              AND (make_date(tahun, bulan, 1) + INTERVAL '1 month' - INTERVAL '1 day')::date <= %(akhir)s
+        ),
+        berperiode AS (
+            SELECT date_trunc(%(grain)s, tanggal::timestamp)::date AS periode, arus, jenis, jumlah, banyak
+            FROM transaksi
+        ),
+        agregat AS (
+            SELECT periode,
+                   CASE WHEN GROUPING(arus) = 1 THEN 'Saldo' ELSE arus END AS arus,
+                   CASE WHEN GROUPING(jenis) = 1 THEN 'Total' ELSE jenis END AS jenis,
+                   CASE WHEN GROUPING(arus) = 1
+                        THEN SUM(CASE WHEN arus = 'Pemasukan' THEN jumlah ELSE -jumlah END)
+                        ELSE SUM(jumlah)
+                   END AS total,
+                   SUM(banyak) AS banyak
+            FROM berperiode
+            GROUP BY GROUPING SETS ((periode, arus, jenis), (periode, arus), (periode))
+        ),
+        kalender AS (
+            SELECT generate_series(date_trunc(%(grain)s, %(awal)s::timestamp),
+                                   %(akhir)s::timestamp,
+                                   %(interval)s::interval)::date AS periode
+        ),
+        lengkap AS (
+            -- Periode tanpa transaksi diisi 0 agar delta dibandingkan dengan periode tepat sebelumnya
+            SELECT k.periode, kunci.arus, kunci.jenis,
+                   COALESCE(a.total, 0) AS total, COALESCE(a.banyak, 0) AS banyak
+            FROM kalender k
+            CROSS JOIN (SELECT DISTINCT arus, jenis FROM agregat) kunci
+            LEFT JOIN agregat a
+                   ON a.periode = k.periode AND a.arus = kunci.arus AND a.jenis = kunci.jenis
+        )
+        SELECT periode, arus, jenis, total, banyak,
+               total - LAG(total) OVER w AS delta,
+               ROUND(100.0 * (total - LAG(total) OVER w) / NULLIF(ABS(LAG(total) OVER w), 0), 1) AS delta_pct
+        FROM lengkap
+        WINDOW w AS (PARTITION BY arus, jenis ORDER BY periode)
+        ORDER BY periode, arus, jenis
+    """, params, fetch=True, raise_error=True)
+    
+    df = pd.DataFrame(result, columns=['Periode', 'Arus', 'Jenis', 'Total', 'Transaksi', 'Delta', 'Delta %'])
+    for kolom in ['Total', 'Transaksi', 'Delta', 'Delta %']:
+        df[kolom] = pd.to_numeric(df[kolom])
+    return df
+
+def laporan_periode():
+    st.header("📆 Laporan Periode")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        tanggal_awal = st.date_input("Dari Tanggal", date(datetime.now().year, 1, 1), key="periode_awal")
+    with col2:
+        tanggal_akhir = st.date_input("Sampai Tanggal", date.today(), key="periode_akhir")
+    with col3:
+        grain = st.selectbox("Periode", list(GRAIN_LAPORAN), index=2,
+                             format_func=lambda g: GRAIN_LAPORAN[g][0], key="periode_grain")
+    
+    if tanggal_awal > tanggal_akhir:
+        st.error("❌ Tanggal awal harus sebelum tanggal akhir")
+        return
+    
+    if grain in ("day", "week"):
+        st.caption("💡 Data tahun yang sudah diarsipkan hanya tersedia untuk periode bulanan, kuartalan dan tahunan")
+    elif tanggal_awal.day != 1 or (tanggal_akhir + timedelta(days=1)).day != 1:
+        st.caption("💡 Rentang tidak dimulai/diakhiri di batas bulan: data arsip untuk bulan yang hanya sebagian masuk rentang tidak dihitung")
+    
+    try:
+        df = ambil_laporan_periode(tanggal_awal, tanggal_akhir, grain, versi=versi_data())
+        
+        if df.empty:
+            st.info("📝 Tidak ada data untuk rentang tanggal ini")
+            return
+        
+        # Totals untuk seluruh rentang
+        df_total = df[df['Jenis'] == 'Total']
+        total_pemasukan = df_total.loc[df_total['Arus'] == 'Pemasukan', 'Total'].sum()
+        total_pengeluaran = df_total.loc[df_total['Arus'] == 'Pengeluaran', 'Total'].sum()
+        saldo = total_pemasukan - total_pengeluaran
+        
+        col1, col2, col3 = st.columns(3)
+        col1.metric("💰 Total Pemasukan", format_angka(total_pemasukan))
+        col2.metric("💸 Total Pengeluaran", format_angka(total_pengeluaran))
+        col3.metric("✅ Saldo", format_angka(saldo),
+                    f"{'Surplus' if saldo >= 0 else 'Defisit'}")
+        
+        fig = px.bar(df_total[df_total['Arus'] != 'Saldo'],
+                     x='Periode',
+                     y='Total',
+                     color='Arus',
+                     title=f'Laporan {GRAIN_LAPORAN[grain][0]} {tanggal_awal.strftime("%d %b %Y")} - {tanggal_akhir.strftime("%d %b %Y")}',
+                     labels={'Total': 'Jumlah (Rp)', 'Periode': ''},
+                     color_discrete_map={'Pemasukan': '#00CC96', 'Pengeluaran': '#EF553B'},
+                     barmode='group')
+        fig.update_traces(hovertemplate='<b>%{x}</b><br>%{y:,.0f} <extra></extra>')
+        fig.update_layout(yaxis_tickformat=',.0f', height=500)
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # Rincian per periode dan jenis
+        st.subheader("📋 Rincian per Periode")
+        arus_pilihan = st.multiselect("Arus", ["Pemasukan", "Pengeluaran", "Saldo"],
+                                      default=["Pemasukan", "Pengeluaran", "Saldo"], key="periode_arus")
+        df_display = df[df['Arus'].isin(arus_pilihan)].copy()
+        df_display['Total'] = df_display['Total'].apply(format_angka)
+        df_display['Delta'] = df_display['Delta'].apply(lambda x: format_angka(x) if pd.notna(x) else "-")
+        st.dataframe(df_display, use_container_width=True, hide_index=True,
+                     column_config={"Delta %": st.column_config.NumberColumn(format="%.1f%%")})
+        
+        # Export option
+        csv_periode = df.to_csv(index=False)
+        st.download_button("📥 Download Laporan Periode (CSV)", csv_periode,
+                           f"laporan_{grain}_{tanggal_awal}_{tanggal_akhir}.csv", "text/csv")
+        
+    except Exception as e:
+        st.error(f"❌ Error loading period report: {e}")
+
 def hapus_data():
     st.header("🗑️ Hapus Data")
     
@@ -698,6 +1338,7 @@ def hapus_data():
                                 # Get the original ID from the data (not from the displayed DF)
                                 original_id = data[idx][0]
                                 execute_query(f"DELETE FROM {table_name} WHERE id = %s", (original_id,))
+                            tandai_perubahan(table_name, tahun, bulan)
                             
                             st.success("✅ Data berhasil dihapus!")
                             st.rerun() # Refresh the page
@@ -723,12 +1364,16 @@ def main():
     
     # Initialize database tables
     create_tables()
+    try:
+        siapkan_notifikasi()
+    except Exception as e:
+        logger.warning("Gagal menyiapkan notifikasi perubahan data: %s", e)
     
     # Sidebar navigation
     menu = st.sidebar.selectbox(
         "Menu Utama",
         ["Dashboard", "Pemasukan", "Pengeluaran", "Kalkulator Truck",
-         "Laporan Keuangan", "Laporan Tahunan", "Hapus Data"]
+         "Laporan Keuangan", "Laporan Tahunan", "Laporan Periode", "Hapus Data"]
     )
     
     if menu == "Dashboard":
@@ -743,12 +1388,117 @@ def main():
         laporan_keuangan()
     elif menu == "Laporan Tahunan":
         laporan_tahunan()
+    elif menu == "Laporan Periode":
+        laporan_periode()
     elif menu == "Hapus Data":
         hapus_data()
     
     # Footer
     st.sidebar.markdown("---")
     st.sidebar.info("🔗 Connected to: kknqpdhkcopfhjqiklne.supabase.co")
+    if not listener_aktif():
+        st.sidebar.caption("⚠️ Notifikasi perubahan data belum aktif, cache laporan diperpendek")
+    
+    # Toggle profiler hanya untuk admin
+    if profiler_admin():
+        st.sidebar.toggle("🔬 Mode Profil", key="mode_profil")
+
+# Folder penyimpanan profil rerun (format collapsed stack)
+PROFIL_DIR = "profil"
+
+# Fungsi halaman yang waktunya ditampilkan terpisah pada profil
+HALAMAN_PROFIL = ["show_dashboard", "input_pemasukan", "input_pengeluaran", "kalkulator_truck",
+                  "laporan_keuangan", "laporan_tahunan", "laporan_periode", "hapus_data"]
+
+# Kategori waktu, dicocokkan dari frame terdalam ke arah luar
+KATEGORI_PROFIL = [
+    ("Database", ("psycopg2", ":execute_query", ":execute_many", ":get_connection", ":create_tables")),
+    ("Arsip Parquet", ("pyarrow", "archive_data.py")),
+    ("Plotly", ("plotly",)),
+    ("Pandas", ("pandas", "numpy")),
+    ("Streamlit", ("streamlit",))
+]
+
+def profiler_admin():
+    """Fitur profiler admin (toggle sidebar, simpan ke disk) diaktifkan lewat secrets [admin] PROFILER"""
+    return bool(st.secrets.get("admin", {}).get("PROFILER", False))
+
+def profil_aktif():
+    """Profil aktif lewat query parameter ?profil=1 atau toggle admin"""
+    return st.query_params.get("profil") == "1" or st.session_state.get("mode_profil", False)
+
+def tampilkan_profil(profiler):
+    """Tampilkan hasil profil satu rerun di bawah halaman"""
+    st.divider()
+    st.header("🔬 Profil Rerun")
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Durasi Rerun", f"{profiler.durasi * 1000:,.0f} ms")
+    col2.metric("Sampel", f"{profiler.sampel:,}")
+    col3.metric("Interval", f"{profiler.interval * 1000:.0f} ms")
+    
+    if not profiler.stacks:
+        st.info("Rerun terlalu cepat untuk disampling")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Waktu per Halaman")
+        df_halaman = pd.DataFrame([(h, profiler.waktu_fungsi(h) * 1000) for h in HALAMAN_PROFIL],
+                                  columns=['Fungsi', 'Total (ms)'])
+        df_halaman = df_halaman[df_halaman['Total (ms)'] > 0]
+        st.dataframe(df_halaman, use_container_width=True, hide_index=True,
+                     column_config={"Total (ms)": st.column_config.NumberColumn(format="%.1f")})
+    with col2:
+        st.subheader("Waktu per Kategori")
+        kategori = profiler.ringkasan_kategori(KATEGORI_PROFIL, default="Aplikasi")
+        df_kategori = pd.DataFrame(sorted(kategori.items(), key=lambda x: -x[1]),
+                                   columns=['Kategori', 'Total (ms)'])
+        df_kategori['Total (ms)'] = df_kategori['Total (ms)'] * 1000
+        st.dataframe(df_kategori, use_container_width=True, hide_index=True,
+                     column_config={"Total (ms)": st.column_config.NumberColumn(format="%.1f")})
+    
+    # Flamegraph (icicle): lebar setiap blok sebanding dengan waktu inklusif
+    ids, labels, parents, values = profiler.pohon()
+    fig = go.Figure(go.Icicle(ids=ids, labels=labels, parents=parents,
+                              values=[v * 1000 for v in values], branchvalues="total",
+                              hovertemplate='<b>%{id}</b><br>%{value:,.1f} ms<extra></extra>',
+                              tiling={'orientation': 'v', 'flip': 'y'}))
+    fig.update_layout(title='Flamegraph', height=600, margin={'t': 40, 'l': 0, 'r': 0, 'b': 0})
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.subheader("Tabel Fungsi")
+    df_fungsi = pd.DataFrame(profiler.tabel_fungsi()[:100], columns=['Fungsi', 'Self (ms)', 'Total (ms)'])
+    df_fungsi[['Self (ms)', 'Total (ms)']] = df_fungsi[['Self (ms)', 'Total (ms)']] * 1000
+    st.dataframe(df_fungsi, use_container_width=True, hide_index=True,
+                 column_config={"Self (ms)": st.column_config.NumberColumn(format="%.1f"),
+                                "Total (ms)": st.column_config.NumberColumn(format="%.1f")})
+    
+    # Simpan profil untuk dibandingkan (flamegraph.pl / speedscope)
+    collapsed = profiler.collapsed()
+    nama_file = f"profil_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    st.download_button("📥 Download Profil (collapsed stack)", collapsed, nama_file, "text/plain")
+    # Menulis ke disk server hanya untuk admin; ?profil=1 saja cukup untuk melihat dan download
+    if profiler_admin() and st.checkbox("💾 Simpan setiap profil ke disk", key="profil_simpan"):
+        os.makedirs(PROFIL_DIR, exist_ok=True)
+        path = os.path.join(PROFIL_DIR, nama_file)
+        with open(path, "w") as f:
+            f.write(collapsed)
+        st.caption(f"Profil disimpan ke {path}")
+
+def jalankan_dengan_profil():
+    """Jalankan satu rerun main() di bawah sampling profiler"""
+    profiler = SamplingProfiler(root=main.__code__)
+    profiler.start()
+    try:
+        main()
+    finally:
+        profiler.stop()
+    # Hanya ditampilkan jika rerun selesai normal (bukan st.rerun/st.stop)
+    tampilkan_profil(profiler)
 
 if __name__ == "__main__":
-    main()
+    if profil_aktif():
+        jalankan_dengan_profil()
+    else:
+        main()
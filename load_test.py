@@ -0,0 +1,352 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+from streamlit.testing.v1 import AppTest
+
+# Load test untuk finance_app.py: menjalankan banyak sesi AppTest secara bersamaan
+# terhadap database Postgres lokal dan mengukur latency rerun, throughput dan koneksi DB.
+#
+# Setiap sesi berjalan di proses sendiri: AppTest.run() mengganti st.secrets dan
+# Runtime._instance secara global per proses, jadi run paralel dalam satu proses
+# saling menimpa (dan bisa jatuh ke secrets.toml produksi).
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "finance_app.py")
+
+# Penanda keterangan untuk data yang dibuat load test, dipakai saat hapus/cleanup
+PENANDA = "[loadtest]"
+
+# Bobot journey pengguna (perkiraan pola pemakaian operator)
+JOURNEYS = {
+    "dashboard": 40,
+    "input_pemasukan": 10,
+    "kalkulator_truck": 10,
+    "laporan_keuangan": 10,
+    "laporan_tahunan": 20,
+    "hapus_data": 10,
+}
+
+
+def build_secrets(database_url):
+    """Bangun isi st.secrets["db"] dari DATABASE_URL"""
+    dsn = parse_dsn(database_url)
+    return {
+        "DATABASE_URL": database_url,
+        "DB_TYPE": "postgresql",
+        "DB_HOST": dsn.get("host", "localhost"),
+        "DB_PORT": dsn.get("port", "5432"),
+        "DB_NAME": dsn.get("dbname", "postgres"),
+        "DB_USER": dsn.get("user", "postgres"),
+        "DB_PASSWORD": dsn.get("password", ""),
+    }
+
+
+class Stats:
+    """Kumpulan hasil pengukuran yang aman dipakai banyak thread"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.journeys = 0
+        self.koneksi = []
+
+    def record(self, action, seconds):
+        with self.lock:
+            self.latencies[action].append(seconds)
+
+    def record_error(self, action):
+        with self.lock:
+            self.errors[action] += 1
+
+    def record_journey(self):
+        with self.lock:
+            self.journeys += 1
+
+    def snapshot(self):
+        """Hasil dalam bentuk yang bisa dikirim antar proses"""
+        with self.lock:
+            return dict(self.latencies), dict(self.errors), self.journeys
+
+    def merge(self, snapshot):
+        latencies, errors, journeys = snapshot
+        with self.lock:
+            for action, values in latencies.items():
+                self.latencies[action].extend(values)
+            for action, count in errors.items():
+                self.errors[action] += count
+            self.journeys += journeys
+
+
+class Session:
+    """Satu sesi pengguna yang menjalankan journey lewat AppTest"""
+
+    def __init__(self, secrets, database_url, stats, timeout):
+        self.stats = stats
+        self.database_url = database_url
+        self.at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+        self.at.secrets["db"] = secrets
+
+    def run(self, action):
+        start = time.perf_counter()
+        try:
+            self.at.run()
+        except Exception:
+            self.stats.record_error(action)
+            raise
+        self.stats.record(action, time.perf_counter() - start)
+        if self.at.exception:
+            self.stats.record_error(action)
+
+    def buka_menu(self, menu):
+        self.at.sidebar.selectbox[0].select(menu)
+        self.run(f"menu:{menu}")
+
+    def text_input(self, label):
+        return next(t for t in self.at.text_input if t.label == label)
+
+    def button(self, label):
+        return next(b for b in self.at.button if b.label == label)
+
+    def cek_tersimpan(self, action, keterangan):
+        """Pastikan submit benar-benar menulis baris; jika tidak, catat sebagai error"""
+        conn = psycopg2.connect(self.database_url)
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT EXISTS (SELECT 1 FROM pemasukan WHERE keterangan = %s)", (keterangan,))
+            tersimpan = cur.fetchone()[0]
+            cur.close()
+        finally:
+            conn.close()
+        if not tersimpan:
+            self.stats.record_error(f"tidak-tersimpan:{action}")
+
+    def dashboard(self):
+        self.buka_menu("Dashboard")
+
+    def input_pemasukan(self):
+        self.buka_menu("Pemasukan")
+        keterangan = f"{PENANDA} pemasukan {uuid.uuid4().hex}"
+        self.at.text_input(key="pemasukan_jumlah_input").input(str(random.randint(1, 500) * 10000))
+        self.text_input("Keterangan").input(keterangan)
+        # Rerun auto-format jumlah harus selesai dulu; st.rerun() membatalkan klik tombol
+        self.run("input:pemasukan")
+        self.button("💾 Simpan Pemasukan").click()
+        self.run("submit:pemasukan")
+        self.cek_tersimpan("submit:pemasukan", keterangan)
+
+    def kalkulator_truck(self):
+        self.buka_menu("Kalkulator Truck")
+        self.at.text_input(key="berangkat_input").input(str(random.randint(30, 80) * 10000))
+        self.at.text_input(key="pulang_input").input(str(random.randint(20, 60) * 10000))
+        self.at.text_input(key="sangu_input").input(str(random.randint(5, 15) * 10000))
+        keterangan = f"{PENANDA} trip {uuid.uuid4().hex}"
+        self.text_input("Keterangan Pendapatan Truck").input(keterangan)
+        self.run("input:truck")
+        self.button("💰 Masukkan ke Pendapatan Truck").click()
+        self.run("submit:truck")
+        self.cek_tersimpan("submit:truck", keterangan)
+
+    def laporan_keuangan(self):
+        self.buka_menu("Laporan Keuangan")
+        bulan = random.randint(1, 12)
+        self.at.selectbox(key="laporan_bulan").select(bulan)
+        self.run("filter:laporan_keuangan")
+
+    def laporan_tahunan(self):
+        self.buka_menu("Laporan Tahunan")
+        tahun = random.randint(2020, datetime.now().year)
+        self.at.selectbox(key="tahunan_tahun").select(tahun)
+        self.run("filter:laporan_tahunan")
+        lebih = [b for b in self.at.button if b.label == "⬇️ Tampilkan lebih banyak"]
+        if lebih:
+            random.choice(lebih).click()
+            self.run("lebih:laporan_tahunan")
+
+    def hapus_data(self):
+        self.buka_menu("Hapus Data")
+        # st.data_editor tidak bisa dikendalikan lewat AppTest, jadi penghapusan
+        # data load test dilakukan langsung dengan DELETE yang sama seperti aplikasi
+        start = time.perf_counter()
+        conn = psycopg2.connect(self.database_url)
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT id FROM pemasukan WHERE keterangan LIKE %s ORDER BY id LIMIT 1",
+                (f"{PENANDA}%",)
+            )
+            row = cur.fetchone()
+            if row:
+                cur.execute("DELETE FROM pemasukan WHERE id = %s", (row[0],))
+            conn.commit()
+            cur.close()
+        finally:
+            conn.close()
+        self.stats.record("delete:pemasukan", time.perf_counter() - start)
+
+
+def secrets_global():
+    """secrets.toml yang tetap dimuat Streamlit walaupun direktori kerja diganti"""
+    path = os.path.expanduser("~/.streamlit/secrets.toml")
+    return path if os.path.exists(path) else None
+
+
+def worker(secrets, database_url, durasi, timeout, think_time, hasil):
+    """Proses satu sesi: jalankan journey acak berurutan selama durasi lalu kirim hasil"""
+    stats = Stats()
+    # Direktori kerja sementara agar .streamlit/secrets.toml milik repo tidak ikut dimuat
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        deadline = time.monotonic() + durasi
+        try:
+            session = Session(secrets, database_url, stats, timeout)
+            names = list(JOURNEYS)
+            weights = list(JOURNEYS.values())
+            while time.monotonic() < deadline:
+                journey = random.choices(names, weights)[0]
+                try:
+                    getattr(session, journey)()
+                    stats.record_journey()
+                except Exception:
+                    stats.record_error(f"journey:{journey}")
+                    # Mulai sesi baru agar state yang rusak tidak terbawa
+                    session = Session(secrets, database_url, stats, timeout)
+                if think_time:
+                    time.sleep(random.uniform(0, think_time))
+        finally:
+            hasil.put(stats.snapshot())
+
+
+def monitor_koneksi(database_url, stats, stop, interval):
+    """Sampling jumlah koneksi ke database selama load test"""
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        while not stop.is_set():
+            cur.execute("SELECT COUNT(*) FROM pg_stat_activity WHERE datname = current_database()")
+            with stats.lock:
+                stats.koneksi.append(cur.fetchone()[0])
+            stop.wait(interval)
+        cur.close()
+    finally:
+        conn.close()
+
+
+def percentiles(values):
+    if len(values) < 2:
+        value = values[0] if values else 0
+        return value, value, value
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return q[49], q[94], q[98]
+
+
+def cleanup(database_url):
+    """Hapus semua data yang dibuat load test"""
+    conn = psycopg2.connect(database_url)
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM pemasukan WHERE keterangan LIKE %s", (f"{PENANDA}%",))
+        deleted = cur.rowcount
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+    return deleted
+
+
+def print_report(stats, elapsed, sessions):
+    print()
+    print(f"Sesi: {sessions}, durasi: {elapsed:.1f} s, journey selesai: {stats.journeys}")
+    print(f"{'Aksi':<28}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'error':>7}")
+
+    semua = []
+    for action in sorted(set(stats.latencies) | set(stats.errors)):
+        values = stats.latencies.get(action, [])
+        semua.extend(values)
+        p50, p95, p99 = percentiles(values)
+        print(f"{action:<28}{len(values):>7}{p50 * 1000:>10.0f}{p95 * 1000:>10.0f}{p99 * 1000:>10.0f}"
+              f"{stats.errors.get(action, 0):>7}")
+
+    p50, p95, p99 = percentiles(semua)
+    print(f"{'TOTAL':<28}{len(semua):>7}{p50 * 1000:>10.0f}{p95 * 1000:>10.0f}{p99 * 1000:>10.0f}"
+          f"{sum(stats.errors.values()):>7}")
+    print()
+    print(f"Throughput: {len(semua) / elapsed:.1f} rerun/s, {stats.journeys / elapsed:.2f} journey/s")
+    if stats.koneksi:
+        print(f"Koneksi DB: rata-rata {statistics.mean(stats.koneksi):.1f}, maksimum {max(stats.koneksi)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test multi-sesi untuk finance_app.py")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"),
+                        help="DSN Postgres lokal (default: env DATABASE_URL)")
+    parser.add_argument("--sessions", type=int, default=10, help="Jumlah sesi bersamaan")
+    parser.add_argument("--duration", type=float, default=60, help="Durasi load test (detik)")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Waktu untuk memulai semua sesi (detik)")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Jeda acak maksimum antar journey (detik)")
+    parser.add_argument("--timeout", type=float, default=30, help="Timeout satu rerun (detik)")
+    parser.add_argument("--no-cleanup", action="store_true", help="Jangan hapus data load test di akhir")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url atau env DATABASE_URL harus diisi")
+    if secrets_global():
+        parser.error(f"{secrets_global()} akan ikut dimuat oleh AppTest; pindahkan dulu agar "
+                     "load test tidak menulis ke database lain")
+
+    secrets = build_secrets(args.database_url)
+    stats = Stats()
+    stop = threading.Event()
+
+    monitor = threading.Thread(target=monitor_koneksi, args=(args.database_url, stats, stop, 0.5), daemon=True)
+    monitor.start()
+
+    print(f"Menjalankan {args.sessions} sesi selama {args.duration:.0f} detik...")
+    ctx = multiprocessing.get_context("spawn")
+    hasil = ctx.Queue()
+    start = time.monotonic()
+    deadline = start + args.ramp_up + args.duration
+    processes = []
+    for i in range(args.sessions):
+        p = ctx.Process(target=worker,
+                        args=(secrets, args.database_url, deadline - time.monotonic(),
+                              args.timeout, args.think_time, hasil),
+                        daemon=True)
+        p.start()
+        processes.append(p)
+        if args.sessions > 1:
+            time.sleep(args.ramp_up / args.sessions)
+
+    # Ambil hasil sebelum join agar proses tidak tertahan oleh queue yang penuh
+    for _ in processes:
+        try:
+            tunggu = max(deadline - time.monotonic(), 0) + args.timeout * 5
+            stats.merge(hasil.get(timeout=tunggu))
+        except queue.Empty:
+            stats.record_error("proses:tidak-ada-hasil")
+    for p in processes:
+        p.join(timeout=args.timeout)
+    elapsed = time.monotonic() - start
+    stop.set()
+    monitor.join()
+
+    print_report(stats, elapsed, args.sessions)
+
+    if not args.no_cleanup:
+        print(f"Cleanup: {cleanup(args.database_url)} baris load test dihapus")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# Sampling profiler ringan untuk satu rerun Streamlit. Thread terpisah mengambil
+# stack thread script secara berkala; setiap sampel diberi bobot waktu sejak
+# sampel sebelumnya sehingga jeda karena GIL tidak membuat hasil bias.
+
+
+class SamplingProfiler:
+    """Kumpulkan stack thread pemanggil start() setiap interval detik"""
+
+    def __init__(self, root=None, interval=0.002):
+        # root: code object fungsi teratas; frame di atasnya (Streamlit runner) dibuang
+        self.root = root
+        self.interval = interval
+        self.stacks = defaultdict(float)
+        self.durasi = 0.0
+        self.sampel = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+        self._mulai = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._mulai = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.durasi = time.perf_counter() - self._mulai
+
+    def _run(self):
+        terakhir = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            sekarang = time.perf_counter()
+            if frame is not None:
+                stack = self._stack(frame)
+                if stack:
+                    self.stacks[stack] += sekarang - terakhir
+                    self.sampel += 1
+            terakhir = sekarang
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+            if code is self.root:
+                break
+            frame = frame.f_back
+        else:
+            if self.root is not None:
+                return None
+        return tuple(reversed(stack))
+
+    @staticmethod
+    def label(frame):
+        filename, name, line = frame
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    def collapsed(self):
+        """Format collapsed stack (flamegraph.pl / speedscope), bobot dalam mikrodetik"""
+        lines = []
+        for stack, detik in sorted(self.stacks.items(), key=lambda x: -x[1]):
+            lines.append(f"{';'.join(self.label(f) for f in stack)} {int(detik * 1_000_000)}")
+        return "\n".join(lines) + "\n"
+
+    def tabel_fungsi(self):
+        """Daftar (fungsi, self detik, total detik) diurutkan dari total terbesar"""
+        self_time = defaultdict(float)
+        total_time = defaultdict(float)
+        for stack, detik in self.stacks.items():
+            self_time[stack[-1]] += detik
+            # Rekursi dihitung sekali per stack
+            for frame in set(stack):
+                total_time[frame] += detik
+        return sorted(((self.label(f), self_time[f], total_time[f]) for f in total_time),
+                      key=lambda x: -x[2])
+
+    def waktu_fungsi(self, nama):
+        """Total detik inklusif untuk fungsi dengan nama tertentu"""
+        return sum(detik for stack, detik in self.stacks.items()
+                   if any(f[1] == nama for f in stack))
+
+    def ringkasan_kategori(self, aturan, default="Lainnya"):
+        """Kelompokkan waktu per kategori berdasarkan frame terdalam yang cocok.
+
+        aturan: list (kategori, tuple substring) yang dicocokkan dengan
+        "path:nama_fungsi" dari frame paling dalam ke arah luar.
+        """
+        hasil = defaultdict(float)
+        for stack, detik in self.stacks.items():
+            kategori = default
+            for filename, name, _ in reversed(stack):
+                teks = f"{filename}:{name}"
+                cocok = next((k for k, pola in aturan if any(p in teks for p in pola)), None)
+                if cocok:
+                    kategori = cocok
+                    break
+            hasil[kategori] += detik
+        return dict(hasil)
+
+    def pohon(self):
+        """Node flamegraph (ids, labels, parents, values) untuk grafik icicle"""
+        values = defaultdict(float)
+        labels = {}
+        parents = {}
+        for stack, detik in self.stacks.items():
+            path = ""
+            for frame in stack:
+                parent = path
+                path = f"{path};{self.label(frame)}" if path else self.label(frame)
+                values[path] += detik
+                labels[path] = frame[1]
+                parents[path] = parent
+        ids = list(values)
+        return ids, [labels[i] for i in ids], [parents[i] for i in ids], [values[i] for i in ids]